@@ -0,0 +1,222 @@
+"""Score a trips or observations file outside the web app.
+
+    python batch_score.py travel_export.csv scored.csv
+    python batch_score.py travel_export.parquet scored.parquet --workers 8
+    python batch_score.py observations.csv scored.csv --kind observing
+
+Travel input needs From, To, Mode and Roundtrip columns. Rows that already
+have From_lat/From_long/To_lat/To_long keep those coordinates. The other
+places are geocoded in the main process, once per canonical place and at
+most one request per second (Nominatim's usage policy). Output rows carry
+From_id/To_id canonical place IDs. A first pass over the From/To columns
+learns every place name and does all the geocoding, so a place gets the
+same ID in every chunk. Observing input needs Telescope and Hours. The
+input is read in chunks and only the vectorized scoring is spread over the
+process pool; chunks are written in their original order.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from distances import DEFAULT_DISTANCE_MODE, DISTANCE_MODES
+from emissions import add_place_ids, geocode_place, observation_co2_tonnes, places, resolve_place, route_co2_kg
+
+COORD_COLUMNS = ["From_lat", "From_long", "To_lat", "To_long"]
+GEOCODER_MIN_INTERVAL = 1.0  # seconds between geocoder requests
+
+_last_geocode = 0.0
+
+
+def polite_geocode(name):
+    global _last_geocode
+    wait = _last_geocode + GEOCODER_MIN_INTERVAL - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    try:
+        return geocode_place(name)
+    finally:
+        _last_geocode = time.monotonic()
+
+
+def _place_coords(name):
+    try:
+        place = resolve_place(name, polite_geocode)
+    except ValueError:
+        return (np.nan, np.nan)
+    return (place.lat, place.lon)
+
+
+def _missing_coords(chunk, end):
+    lat, lon = f"{end}_lat", f"{end}_long"
+    if lat not in chunk.columns or lon not in chunk.columns:
+        return pd.Series(True, index=chunk.index)
+    return pd.to_numeric(chunk[lat], errors="coerce").isna() | pd.to_numeric(chunk[lon], errors="coerce").isna()
+
+
+def prepare_places(path, chunksize):
+    """First pass over the From/To columns, before anything is scored.
+
+    Learns every place name and geocodes each place that some row has no
+    coordinates for, so the registry no longer changes while chunks are
+    scored and each place gets one ID for the whole file.
+    """
+    present = set(input_columns(path))
+    columns = ["From", "To"] + [col for col in COORD_COLUMNS if col in present]
+    to_locate = set()
+    for chunk in read_chunks(path, chunksize, columns):
+        for end in ("From", "To"):
+            names = chunk[end].astype(str)
+            for name in names.unique():
+                places.learn(name)
+            to_locate.update(names[_missing_coords(chunk, end)].unique())
+    for name in sorted(to_locate):
+        _place_coords(name)
+
+
+def locate_trips(chunk):
+    """Fills missing From/To coordinates and adds place IDs. Runs in the main
+    process after prepare_places, so every place is already in the registry."""
+    chunk = chunk.copy()
+    for col in COORD_COLUMNS:
+        if col not in chunk.columns:
+            chunk[col] = np.nan
+        chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+    for end in ("From", "To"):
+        missing = _missing_coords(chunk, end)
+        if missing.any():
+            names = chunk.loc[missing, end].astype(str)
+            coords = {name: _place_coords(name) for name in names.unique()}
+            chunk.loc[missing, f"{end}_lat"] = names.map(lambda name: coords[name][0])
+            chunk.loc[missing, f"{end}_long"] = names.map(lambda name: coords[name][1])
+    add_place_ids(chunk)
+    return chunk
+
+
+def score_trips(chunk, distance_mode=DEFAULT_DISTANCE_MODE):
+    chunk = chunk.copy()
+    chunk["CO2_kg"] = route_co2_kg(chunk, distance_mode=distance_mode)
+    return chunk
+
+
+def score_observations(chunk):
+    chunk = chunk.copy()
+    chunk["CO2_tonnes"] = observation_co2_tonnes(chunk)
+    return chunk
+
+
+def score_chunk(chunk, kind, distance_mode):
+    if kind == "travel":
+        return score_trips(chunk, distance_mode)
+    return score_observations(chunk)
+
+
+def input_columns(path):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_chunks(path, chunksize, columns=None):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        # Read as text so a column's type doesn't depend on which chunk it is in
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=str, usecols=columns)
+
+
+def output_schema(input_path, kind):
+    """Parquet schema fixed before the first chunk: input columns keep their
+    types (text for CSV input) and the scored columns get theirs."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if kind == "travel":
+        scored = [(col, pa.float64()) for col in COORD_COLUMNS]
+        scored += [("CO2_kg", pa.float64()), ("From_id", pa.int64()), ("To_id", pa.int64())]
+    else:
+        scored = [("CO2_tonnes", pa.float64())]
+    if input_path.endswith(".parquet"):
+        fields = list(pq.read_schema(input_path))
+    else:
+        fields = [pa.field(col, pa.string()) for col in input_columns(input_path)]
+    names = {name for name, _ in scored}
+    fields = [field for field in fields if field.name not in names]
+    return pa.schema(fields + [pa.field(name, dtype) for name, dtype in scored])
+
+
+class ChunkWriter:
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema
+        self._parquet = None
+        self._first = True
+
+    def write(self, chunk):
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, self.schema)
+            self._parquet.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+        else:
+            chunk.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV or Parquet file")
+    parser.add_argument("output", help="CSV or Parquet file (by extension)")
+    parser.add_argument("--kind", choices=["travel", "observing"], default="travel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=2000)
+    parser.add_argument("--distance-mode", choices=DISTANCE_MODES, default=DEFAULT_DISTANCE_MODE)
+    args = parser.parse_args(argv)
+
+    if args.kind == "travel":
+        prepare_places(args.input, args.chunksize)
+    schema = output_schema(args.input, args.kind) if args.output.endswith(".parquet") else None
+    writer = ChunkWriter(args.output, schema)
+    rows = 0
+    unresolved = 0
+    # Keep a bounded number of chunks in flight so the input is streamed
+    # rather than read into memory all at once.
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunks = read_chunks(args.input, args.chunksize)
+        while True:
+            while len(pending) < 2 * args.workers:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if args.kind == "travel":
+                    chunk = locate_trips(chunk)
+                pending.append(pool.submit(score_chunk, chunk, args.kind, args.distance_mode))
+            if not pending:
+                break
+            scored = pending.popleft().result()
+            writer.write(scored)
+            rows += len(scored)
+            if args.kind == "travel":
+                unresolved += int(scored["CO2_kg"].isna().sum())
+    writer.close()
+
+    print(f"Scored {rows:,} rows -> {args.output}", file=sys.stderr)
+    if unresolved:
+        print(f"{unresolved:,} rows could not be scored (unknown place or mode)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Speed/accuracy trade-off of the distance modes in distances.py.
+
+    python bench_distance.py                      # known cities + 50k random routes
+    python bench_distance.py records.csv          # routes from an exported sheet
+    python bench_distance.py -n 1000000
+
+The default route set is every pair of cities in emissions.city_coords plus
+50k random routes (seed 0), the set behind the error bounds documented in
+distances.py.
+
+Accuracy is measured against the exact WGS84 geodesic. Routes shorter than
+10 km or longer than 19,000 km (near-antipodal) are left out, as neither
+shows up in our travel records.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from distances import DISTANCE_MODES, distance_km, geodesic_km
+from emissions import city_coords
+
+
+def city_pair_routes():
+    coords = np.array(list(city_coords.values()), dtype=float)
+    i, j = np.where(~np.eye(len(coords), dtype=bool))
+    return coords[i, 0], coords[i, 1], coords[j, 0], coords[j, 1]
+
+
+def random_routes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, size=(2, n))))  # uniform on the sphere
+    lon = rng.uniform(-180, 180, size=(2, n))
+    return lat[0], lon[0], lat[1], lon[1]
+
+
+def record_routes(path):
+    df = pd.read_csv(path)
+    return (df["From_lat"].to_numpy(float), df["From_long"].to_numpy(float),
+            df["To_lat"].to_numpy(float), df["To_long"].to_numpy(float))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("records", nargs="?", help="CSV with From_lat, From_long, To_lat, To_long columns")
+    parser.add_argument("-n", type=int, default=50_000, help="number of random routes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.records:
+        routes = record_routes(args.records)
+    else:
+        routes = tuple(np.concatenate(parts) for parts in zip(city_pair_routes(), random_routes(args.n)))
+    exact = geodesic_km(*routes)
+    keep = (exact >= 10) & (exact <= 19_000)
+    routes = tuple(x[keep] for x in routes)
+    exact = exact[keep]
+    print(f"{len(exact):,} routes, {exact.min():,.0f}-{exact.max():,.0f} km\n")
+
+    print(f"{'mode':<10} {'time (ms)':>10} {'speedup':>8} {'max rel err':>12} {'mean rel err':>13}")
+    baseline = None
+    for mode in DISTANCE_MODES:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            approx = distance_km(*routes, mode=mode)
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        rel = np.abs(approx - exact) / exact
+        print(f"{mode:<10} {best * 1000:>10.1f} {baseline / best:>7.1f}x {rel.max():>11.5%} {rel.mean():>12.5%}")
+
+
+if __name__ == "__main__":
+    main()
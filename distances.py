@@ -0,0 +1,64 @@
+import numpy as np
+from pyproj import Geod
+
+# --- Distance modes ---
+# "geodesic" is the exact WGS84 ellipsoidal distance and stays the default for
+# submitted records. The two approximations are vectorized and meant for
+# dashboard-only recomputation and what-if analysis. Maximum relative error
+# versus WGS84 over routes of 10-19,000 km (every pair of our known cities
+# plus 50k random pairs, see bench_distance.py):
+#   "andoyer"   : < 0.003 %  (Andoyer-Lambert, first-order flattening term)
+#   "haversine" : < 0.6 %    (sphere of mean radius 6371.0088 km)
+DISTANCE_MODES = ("geodesic", "andoyer", "haversine")
+DEFAULT_DISTANCE_MODE = "geodesic"
+
+WGS84_A = 6378.137  # km
+WGS84_F = 1 / 298.257223563
+EARTH_MEAN_RADIUS = 6371.0088  # km
+
+geod = Geod(ellps="WGS84")
+
+
+def geodesic_km(lat1, lon1, lat2, lon2):
+    _, _, metres = geod.inv(np.asarray(lon1, dtype=float), np.asarray(lat1, dtype=float),
+                            np.asarray(lon2, dtype=float), np.asarray(lat2, dtype=float))
+    return np.asarray(metres) / 1000
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_MEAN_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def andoyer_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    F = (lat1 + lat2) / 2
+    G = (lat1 - lat2) / 2
+    L = (lon1 - lon2) / 2
+    S = np.sin(G) ** 2 * np.cos(L) ** 2 + np.cos(F) ** 2 * np.sin(L) ** 2
+    C = np.cos(G) ** 2 * np.cos(L) ** 2 + np.sin(F) ** 2 * np.sin(L) ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.arctan(np.sqrt(S / C))
+        R = np.sqrt(S * C) / w
+        D = 2 * w * WGS84_A
+        H1 = (3 * R - 1) / (2 * C)
+        H2 = (3 * R + 1) / (2 * S)
+        dist = D * (1 + WGS84_F * H1 * np.sin(F) ** 2 * np.cos(G) ** 2
+                      - WGS84_F * H2 * np.cos(F) ** 2 * np.sin(G) ** 2)
+    # Coincident points give 0/0 above
+    return np.where(S == 0, 0.0, dist)
+
+
+distance_functions = {
+    "geodesic": geodesic_km,
+    "andoyer": andoyer_km,
+    "haversine": haversine_km,
+}
+
+
+def distance_km(lat1, lon1, lat2, lon2, mode=DEFAULT_DISTANCE_MODE):
+    """Vectorized distance in kilometres between arrays of points."""
+    if mode not in distance_functions:
+        raise ValueError(f"Unknown distance mode {mode!r}, expected one of {DISTANCE_MODES}")
+    return distance_functions[mode](lat1, lon1, lat2, lon2)
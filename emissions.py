@@ -0,0 +1,208 @@
+"""Emissions scoring shared by the Streamlit apps and the batch CLI.
+
+Nothing in here touches Streamlit or Google Sheets, so it can be imported
+from worker processes.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+import requests
+from geopy.distance import geodesic
+from geopy.geocoders import Nominatim
+
+from distances import DEFAULT_DISTANCE_MODE, distance_km
+from places import PlaceRegistry, city_countries, country_aliases
+from route_memo import RouteMemo, ScoredRoute
+
+geolocator = Nominatim(user_agent="travel_app")
+
+
+def geocode_place(city):
+    """(lat, lon, ISO country code or None) for a place name, or None."""
+    # Try Photon first
+    try:
+        url = f"https://photon.komoot.io/api/?q={city}"
+        r = requests.get(url, timeout=5)
+        if r.status_code == 200:
+            data = r.json()
+            if data["features"]:
+                lat = data["features"][0]["geometry"]["coordinates"][1]
+                lon = data["features"][0]["geometry"]["coordinates"][0]
+                country = data["features"][0]["properties"].get("countrycode")
+                return lat, lon, country
+    except:
+        pass
+
+    # Fallback to Nominatim
+    try:
+        location = geolocator.geocode(city, addressdetails=True)
+        if location:
+            country = location.raw.get("address", {}).get("country_code")
+            return location.latitude, location.longitude, country and country.upper()
+    except:
+        pass
+
+    return None
+
+
+def get_city_coords(city):
+    result = geocode_place(city)
+    return result[:2] if result is not None else None
+
+
+# --- Travel CO₂ factors (kg CO₂ per km) ---
+co2_factors = {
+    "Plane": 0.254,
+    "Train": 0.02,
+    "Car": 0.2,
+    "Bus": 0.07
+}
+# Long-haul flights have a lower factor per km
+PLANE_LONG_HAUL_KM = 3500
+PLANE_LONG_HAUL_FACTOR = 0.18
+
+city_coords = {
+    "Santiago": (-33.4489, -70.6693),
+    "Toronto": (43.6532, -79.3832),
+    "Paris": (48.8566, 2.3522),
+    "New York": (40.7128, -74.0060),
+    "London": (51.5074, -0.1278),
+    "Montreal": (45.5031824, -73.5698065),
+    "Lisbon": (38.7077507, -9.1365919),
+    "Porto": (41.1502195, -8.6103497),
+    "Halifax": (44.648618, -63.5859487),
+    "Geneva": (46.2044, 6.1432),
+    "Grenoble": (45.1885, 5.7245),
+    "La Serena": (-29.9045, -71.2489),
+    "Amsterdam": (52.3676, 4.9041),
+    "Hamilton": (43.2557, -79.8711),
+    "Madrid": (40.4168, -3.7038),
+    "Munich": (48.1351, 11.5820),
+    "Lyon": (45.7640, 4.8357),
+    "Nice": (43.7102, 7.2620),
+    "Marseille": (43.2965, 5.3698),
+    "Anchorage": (61.2181, -149.9003),
+    "Laval": (45.5571125, -73.7211779),
+    "Saint-Alexis-des-Monts": (46.462694, -73.143196),
+    "Trois-Rivières": (46.3432325, -72.5428485),
+    "Sherbrooke":(45.403271, -71.889038)
+}
+
+# --- Telescope CO₂ factors (tonnes CO₂ per hour, Knödlseder et al. 2022) ---
+telescope_co2_factors = {
+    "JWST": 13.69863014,
+    "HST": 4.185692542,
+    "Kepler": 0.9236197592,
+    "Spitzer": 1.116928552,
+    "TESS": 0.4392465753,
+    "VLT": 6.160445205,
+    "Gemini": 1.110502283,
+    "CFHT": 0.9701940639,
+    "ESO 3.6": 0.9087671233,
+    "Keck": 0.375,
+}
+
+
+# Canonical places, seeded with city_coords. Geocoded places are added as they
+# are looked up, so each distinct place is geocoded once per process.
+places = PlaceRegistry(city_coords)
+
+
+def resolve_place(name, geocode=geocode_place):
+    """Canonical Place (id, key, name, lat, lon), from the registry or the geocoder."""
+    place = places.resolve(name, geocode)
+    if place is None:
+        raise ValueError(f"Could not find a location for {name!r}")
+    return place
+
+
+def trip_co2_rate(mode, distance):
+    co2_rate = co2_factors.get(mode)
+    if distance > PLANE_LONG_HAUL_KM and mode == "Plane":
+        co2_rate = PLANE_LONG_HAUL_FACTOR
+    return co2_rate
+
+
+def scoring_version():
+    """Short hash of the tables calc_co2 depends on, including the ones that
+    decide place keys. Memoized routes scored under a different version are
+    thrown away."""
+    tables = [co2_factors, PLANE_LONG_HAUL_KM, PLANE_LONG_HAUL_FACTOR, city_coords,
+              country_aliases, city_countries]
+    return hashlib.sha1(json.dumps(tables, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+# --- Function to calculate CO₂ per row ---
+def calc_co2(row, geocode=geocode_place, memo=None):
+    """From/To coordinates and kg of CO₂ for one trip, using the exact geodesic.
+
+    With a RouteMemo, a repeat itinerary is answered from the memo without
+    geocoding or distance math. Raises ValueError if either place cannot be
+    located.
+    """
+    key = RouteMemo.key(places.key(row["From"]), places.key(row["To"]), row["Mode"], row["Roundtrip"])
+    route = memo.get(key) if memo is not None else None
+
+    if route is None:
+        A = resolve_place(row["From"], geocode)
+        B = resolve_place(row["To"], geocode)
+
+        # Calculate distance (in kilometers)
+        distance = geodesic((A.lat, A.lon), (B.lat, B.lon)).kilometers
+        co2_rate = trip_co2_rate(row["Mode"], distance)
+        if row["Roundtrip"]:
+            distance *= 2
+        route = ScoredRoute(A.lat, A.lon, B.lat, B.lon, distance, co2_rate, float(distance*co2_rate))
+        if memo is not None:
+            # Resolving may have learned a country, so store under the final keys
+            memo.put(RouteMemo.key(A.key, B.key, row["Mode"], row["Roundtrip"]), route)
+
+    return pd.Series([route.from_lat, route.from_lon, route.to_lat, route.to_lon, route.co2_kg])
+
+
+def add_place_ids(records):
+    """Adds From_id/To_id columns, with one normalization per distinct name.
+
+    Country-qualified names in the records are learned first, so "Berlin"
+    and "Berlin, Germany" get the same ID even for places the registry has
+    never geocoded.
+    """
+    names = {end: records[end].astype(str) for end in ("From", "To")}
+    distinct = set(names["From"].unique()) | set(names["To"].unique())
+    for name in distinct:
+        places.learn(name)
+    ids = {name: places.place_id(name) for name in distinct}
+    for end in ("From", "To"):
+        records[f"{end}_id"] = names[end].map(ids).astype("int64")
+    return records
+
+
+def parse_roundtrip(values):
+    """Sheets and CSVs hand booleans back as 'TRUE'/'FALSE' strings."""
+    return pd.Series(values).astype(str).str.strip().str.upper().isin(["TRUE", "1", "YES", "Y"]).to_numpy()
+
+
+def route_co2_kg(records, distance_mode=DEFAULT_DISTANCE_MODE):
+    """Vectorized kg of CO₂ for records that already carry From/To coordinates."""
+    distance = distance_km(records["From_lat"], records["From_long"],
+                           records["To_lat"], records["To_long"], mode=distance_mode)
+    co2_rate = records["Mode"].map(co2_factors).to_numpy(dtype=float)
+    co2_rate = np.where((distance > PLANE_LONG_HAUL_KM) & (records["Mode"] == "Plane").to_numpy(),
+                        PLANE_LONG_HAUL_FACTOR, co2_rate)
+    distance = np.where(parse_roundtrip(records["Roundtrip"]), distance * 2, distance)
+    return distance * co2_rate
+
+
+def co2_from_obs(row):
+    tel = row['Telescope']
+    hour = float(row['Hours'])
+    co2_rate = telescope_co2_factors.get(tel)
+    return pd.Series([float(hour*co2_rate)])
+
+
+def observation_co2_tonnes(records):
+    """Vectorized tonnes of CO₂ for a frame of Telescope/Hours observations."""
+    hours = pd.to_numeric(records["Hours"], errors="coerce")
+    return (hours * records["Telescope"].map(telescope_co2_factors)).to_numpy(dtype=float)
@@ -5,13 +5,17 @@ from google.oauth2.service_account import Credentials
 from datetime import datetime
 import matplotlib.pyplot as plt
 
-import requests
 
 import streamlit as st
 import math
 import time
 import threading
 
+from emissions import co2_from_obs
+from record_list import RecordList
+from rollups import EmissionRollups
+from sheet_cache import SingleFlightLoader
+
 lock = threading.Lock()
 telescope_colors = {
     # Space telescopes (blue–purple tones)
@@ -36,8 +40,6 @@ def safe_append(sheet, rows):
             st.error(f"Error writing to sheet: {e}")
             time.sleep(2)
 
-if "delete_trigger" not in st.session_state:
-    st.session_state.delete_trigger = 0  # used to force rerun on delete
 st.set_page_config(page_title="Institute Travel CO2", layout="wide")
 st.title("🔭 Institute-Wide CO2 Emissions from Observing 🔭")
 st.text("On this webpage, we will calculate the CO2 emissions from our telescope use. Here you input all of the new observations you took this year.\
@@ -46,6 +48,8 @@ st.text("On this webpage, we will calculate the CO2 emissions from our telescope
 
 # --- Google Sheets connection ---
 SHEET_KEY = "1iKFaS57XbMItrd4IyNfe5uADxeZq2ZTBaf2dT3zFbQU"
+# Authorized once per server process and shared by every session.
+@st.cache_resource
 def connect_to_gsheet():
     creds = Credentials.from_service_account_info(
         st.secrets["gcp_service_account"],
@@ -54,150 +58,189 @@ def connect_to_gsheet():
     client = gspread.authorize(creds)
     return client.open_by_key(SHEET_KEY).sheet1
 
-@st.cache_data(ttl=5)
+# One shared loader: concurrent reruns wait on a single get_all_records call,
+# and the TTL stretches as the per-minute read quota runs low.
+@st.cache_resource
+def get_records_loader():
+    return SingleFlightLoader(connect_to_gsheet().get_all_records, base_ttl=5)
+
 def load_all_records():
-    sheet = connect_to_gsheet()
-    return pd.DataFrame(sheet.get_all_records())
+    return pd.DataFrame(get_records_loader().get())
 sheet = connect_to_gsheet()
 
-if "trips_df" not in st.session_state:
-    st.session_state.trips_df = pd.DataFrame(columns=["Telescope", "Hours"])
+TELESCOPES = ['JWST','HST','Kepler','Spitzer','TESS','VLT','Gemini','CFHT','ESO 3.6','Keck']
+if "observations" not in st.session_state:
+    st.session_state.observations = RecordList(["Telescope", "Hours"], defaults={"Telescope": "JWST"})
+
+def apply_observation_edits():
+    observations = st.session_state.observations
+    observations.apply_edits(st.session_state[f"observations_editor_{observations.version}"])
+
+# --- Observation entry fragment ---
+# Reruns on its own, so editing your observation list doesn't rebuild the dashboard.
+@st.fragment
+def observation_entry():
+    observations = st.session_state.observations
 
-# --- Add trips form ---
-with st.form("add_trip_form"):
-    col1, col2, col3, col4 = st.columns([3,3,1,2])
-    with col1:
-        from_loc = st.selectbox("Choose a Telescope",['JWST','HST','Kepler','Spitzer','TESS','VLT','Gemini','CFHT','ESO 3.6','Keck'])
-    with col2:
-        to_loc = st.text_input("Hours of Observation: ")
+    # --- Add trips form ---
+    with st.form("add_trip_form"):
+        col1, col2, col3, col4 = st.columns([3,3,1,2])
+        with col1:
+            from_loc = st.selectbox("Choose a Telescope",TELESCOPES)
+        with col2:
+            to_loc = st.text_input("Hours of Observation: ")
 
     
-    submitted = st.form_submit_button("Add Observation")
-    if submitted:
-        st.session_state.trips_df = pd.concat([
-            st.session_state.trips_df,
-            pd.DataFrame([{"Telescope": from_loc, "Hours": to_loc,}])
-        ], ignore_index=True)
-
-# --- Display and delete trips ---
-if not st.session_state.trips_df.empty:
-    st.subheader("Your Observations:")
-    for i, row in st.session_state.trips_df.iterrows():
-        cols = st.columns([3, 3, 1, 2, 1])
-        cols[0].write("Telescope: "+row["Telescope"])
-        cols[1].write("Hours of Observation: "+row["Hours"])
-        if cols[4].button("🗑️", key=f"delete_{i}"):
-            st.session_state.trips_df.drop(i, inplace=True)
-            st.session_state.trips_df.reset_index(drop=True, inplace=True)
-            st.session_state.delete_trigger += 1  # force rerun
-            st.rerun()
-else:
-    st.info("No observations added yet.")
-
-co2_factors = {
-    "JWST": 13.69863014,
-    "HST": 4.185692542,
-    "Kepler": 0.9236197592,
-    "Spitzer": 1.116928552,
-    "TESS": 0.4392465753,
-    "VLT": 6.160445205,
-    "Gemini": 1.110502283,
-    "CFHT": 0.9701940639,
-    "ESO 3.6": 0.9087671233,
-    "Keck": 0.375,
-}
-# --- Function to calculate CO₂ per row ---
-def co2_from_obs(row):
-    tel = row['Telescope']
-    hour = float(row['Hours'])
-    co2_rate = co2_factors.get(tel)
-    return pd.Series([float(hour*co2_rate)])
-
-# --- Submit new trips ---
-if st.button("Submit Your Observations", key="submit_obs"):
-    if st.session_state.trips_df.empty:
-        st.warning("Please add at least one observation before submitting!")
+        submitted = st.form_submit_button("Add Observation")
+        if submitted:
+            observations.append({"Telescope": from_loc, "Hours": to_loc,})
+
+    # --- Edit and delete observations ---
+    # One grid: edit cells inline, select rows and press Delete to remove them.
+    if len(observations):
+        st.subheader("Your Observations:")
+        st.data_editor(
+            observations.to_frame(),
+            key=f"observations_editor_{observations.version}",
+            on_change=apply_observation_edits,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Telescope": st.column_config.SelectboxColumn("Telescope", options=TELESCOPES, default="JWST", required=True),
+                "Hours": st.column_config.TextColumn("Hours of Observation", required=True),
+            },
+        )
     else:
-        timestamp = datetime.now().isoformat()
-        
-        df = st.session_state.trips_df.copy()
-        df[['CO2_tonnes']]  = df.apply(co2_from_obs, axis=1)
-        df["Timestamp"] = timestamp 
-
-        rows = df[["Timestamp","Telescope","Hours","CO2_tonnes"]].values.tolist()
-        safe_append(sheet, rows)
+        st.info("No observations added yet.")
 
-        st.success("✅ Observations submitted! Your CO2 contribution is "+str(round(df["CO2_tonnes"].sum(),2))+" tonnes. For reference, the average Canadian has a contribution of 14.87 CO2 tonnes/year. To reach the goals set by the Paris Agreement of limiting warming to 2 degrees Celsius, the global average yearly emissions per capita should be 3.3 tonnes CO2 by 2030.")
-        
+# --- Submission fragment ---
+@st.fragment
+def submit_observations():
+    if "last_submission" in st.session_state:
+        st.success(st.session_state.pop("last_submission"))
 
-        # Clear local trips
-        st.session_state.trips_df = pd.DataFrame(columns=["Timestamp", "Telescope", "Hours", "CO2_tonnes"])
-
-
-# --- Fetch all data from Google Sheet for plotting ---
-all_records = load_all_records()
-if not all_records.empty:
-    total_co2 = sum(all_records["CO2_tonnes"])
-        # --- CO₂ offset parameters ---
-    kg_per_tree = 21  # average CO₂ absorbed per tree per year
-    trees_needed = math.ceil(total_co2*1000 / kg_per_tree)
-
-    # --- 1️⃣ Metric for total CO₂ ---
-    st.metric("Total CO₂ Emitted (tonnes) from IREX", f"{total_co2:,.0f}")
-
-    # --- 2️⃣ Tree emoji visualization ---
-    st.metric(f"Trees needed to offset the entire institute's emissions: ", f"{trees_needed:,.0f}")
-    # For readability, scale if very high
-    max_trees_display = 1200
-    scaled_trees = min(trees_needed, max_trees_display)
-    rows = math.ceil(scaled_trees / 80)
-
-    for i in range(rows):
-        st.write("🌳" * min(80, scaled_trees - i * 80))
-    if trees_needed > max_trees_display:
-        st.write(f"…and {trees_needed - max_trees_display} more trees required.")
-        montroyals = round(1/(trees_needed*((0.01)/(750*10))))
-        if montroyals ==0:
-            montroyals = round(trees_needed*((0.01)/(750*10)))
-            st.write(f"This is equivalent to about {montroyals} Mont Royal forests!")
+    if st.button("Submit Your Observations", key="submit_obs"):
+        if not len(st.session_state.observations):
+            st.warning("Please add at least one observation before submitting!")
         else:
-            st.write(f"This is equivalent to about 1/{montroyals} Mont Royal forests!")
-    co2_per_role = all_records.groupby("Telescope")["CO2_tonnes"].sum().reset_index()
-    # Define which telescopes are space vs ground
-    space_telescopes = {"JWST", "HST", "Kepler", "Spitzer", "TESS"}
-    ground_telescopes = {"VLT", "Gemini", "CFHT", "ESO 3.6", "Keck"}
-
-    # Add a 'type' column
-    co2_per_role["type"] = co2_per_role["Telescope"].apply(
-        lambda x: "Space" if x in space_telescopes else "Ground"
-    )
-
-    # Sort: space first, then ground
-    co2_per_role = co2_per_role.sort_values("type")
+            timestamp = datetime.now().isoformat()
+        
+            df = st.session_state.observations.to_frame()
+            df[['CO2_tonnes']]  = df.apply(co2_from_obs, axis=1)
+            df["Timestamp"] = timestamp 
 
-    # Generate colors
-    colors = [telescope_colors.get(t, "gray") for t in co2_per_role["Telescope"]]
+            rows = df[["Timestamp","Telescope","Hours","CO2_tonnes"]].values.tolist()
+            safe_append(sheet, rows)
+            get_records_loader().invalidate()
 
-    # --- Create subplots ---
-    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+            message = ("✅ Observations submitted! Your CO2 contribution is "+str(round(df["CO2_tonnes"].sum(),2))+" tonnes. For reference, the average Canadian has a contribution of 14.87 CO2 tonnes/year. To reach the goals set by the Paris Agreement of limiting warming to 2 degrees Celsius, the global average yearly emissions per capita should be 3.3 tonnes CO2 by 2030.")
+        
 
-    # Bar chart
-    axes[0].bar(co2_per_role["Telescope"], co2_per_role["CO2_tonnes"], color=colors)
-    axes[0].set_ylabel("CO₂ Emissions (tonnes)")
-    axes[0].set_title("Total CO₂ per Telescope (Bar Chart)")
-    axes[0].tick_params(axis='x', rotation=45)
+            # Clear local trips
+            st.session_state.observations.clear()
+            st.session_state.last_submission = message
+            st.rerun()  # redraw the observation list and the dashboard once
+
+
+# --- Time-series rollups ---
+# Shared by every session and updated with each newly appended batch of rows.
+@st.cache_resource
+def get_rollups():
+    return EmissionRollups("CO2_tonnes", ["Telescope"])
+
+# --- Institute dashboard fragment ---
+# Refreshes on its own schedule instead of on every widget interaction.
+DASHBOARD_REFRESH = "60s"
+
+@st.fragment(run_every=DASHBOARD_REFRESH)
+def dashboard():
+    # --- Fetch all data from Google Sheet for plotting ---
+    all_records = load_all_records()
+    if not all_records.empty:
+        rollups = get_rollups()
+        rollups.update(all_records)
+
+        total_co2 = sum(all_records["CO2_tonnes"])
+            # --- CO₂ offset parameters ---
+        kg_per_tree = 21  # average CO₂ absorbed per tree per year
+        trees_needed = math.ceil(total_co2*1000 / kg_per_tree)
+
+        # --- 1️⃣ Metric for total CO₂ ---
+        st.metric("Total CO₂ Emitted (tonnes) from IREX", f"{total_co2:,.0f}")
+
+        # --- 2️⃣ Tree emoji visualization ---
+        st.metric(f"Trees needed to offset the entire institute's emissions: ", f"{trees_needed:,.0f}")
+        # For readability, scale if very high
+        max_trees_display = 1200
+        scaled_trees = min(trees_needed, max_trees_display)
+        rows = math.ceil(scaled_trees / 80)
+
+        for i in range(rows):
+            st.write("🌳" * min(80, scaled_trees - i * 80))
+        if trees_needed > max_trees_display:
+            st.write(f"…and {trees_needed - max_trees_display} more trees required.")
+            montroyals = round(1/(trees_needed*((0.01)/(750*10))))
+            if montroyals ==0:
+                montroyals = round(trees_needed*((0.01)/(750*10)))
+                st.write(f"This is equivalent to about {montroyals} Mont Royal forests!")
+            else:
+                st.write(f"This is equivalent to about 1/{montroyals} Mont Royal forests!")
+        co2_per_role = all_records.groupby("Telescope")["CO2_tonnes"].sum().reset_index()
+        # Define which telescopes are space vs ground
+        space_telescopes = {"JWST", "HST", "Kepler", "Spitzer", "TESS"}
+        ground_telescopes = {"VLT", "Gemini", "CFHT", "ESO 3.6", "Keck"}
+
+        # Add a 'type' column
+        co2_per_role["type"] = co2_per_role["Telescope"].apply(
+            lambda x: "Space" if x in space_telescopes else "Ground"
+        )
+
+        # Sort: space first, then ground
+        co2_per_role = co2_per_role.sort_values("type")
+
+        # Generate colors
+        colors = [telescope_colors.get(t, "gray") for t in co2_per_role["Telescope"]]
+
+        # --- Create subplots ---
+        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+
+        # Bar chart
+        axes[0].bar(co2_per_role["Telescope"], co2_per_role["CO2_tonnes"], color=colors)
+        axes[0].set_ylabel("CO₂ Emissions (tonnes)")
+        axes[0].set_title("Total CO₂ per Telescope (Bar Chart)")
+        axes[0].tick_params(axis='x', rotation=45)
+
+        # Pie chart
+        axes[1].pie(
+            co2_per_role["CO2_tonnes"],
+            labels=co2_per_role["Telescope"],
+            colors=colors,
+            startangle=45,
+            counterclock=False
+        )
+        axes[1].set_title("CO₂ Emission Share per Telescope")
+
+        plt.tight_layout()
+        st.pyplot(fig, use_container_width=True)
+        plt.close(fig)  # the dashboard reruns every minute; don't leak figures
+
+        # --- Emissions over time ---
+        st.subheader("Emissions over time")
+        col1, col2 = st.columns(2)
+        with col1:
+            granularity = st.radio("Per", ["day", "week", "month"], index=2, horizontal=True, key="trend_granularity")
+        with col2:
+            dimension = st.selectbox("Split by", ["All", "Telescope"], key="trend_dimension")
+        trend = rollups.series(granularity, dimension)
+        if not trend.empty:
+            st.line_chart(trend, y_label="CO₂ Emissions (tonnes)")
+        last_30 = sum(rollups.rolling_total(30).values())
+        st.metric("CO₂ Emitted in the last 30 days (tonnes)", f"{last_30:,.1f}")
+    else:
+        st.info("No observations submitted yet.")
 
-    # Pie chart
-    axes[1].pie(
-        co2_per_role["CO2_tonnes"],
-        labels=co2_per_role["Telescope"],
-        colors=colors,
-        startangle=45,
-        counterclock=False
-    )
-    axes[1].set_title("CO₂ Emission Share per Telescope")
 
-    plt.tight_layout()
-    st.pyplot(fig, use_container_width=True)
-else:
-    st.info("No observations submitted yet.")
\ No newline at end of file
+observation_entry()
+submit_observations()
+dashboard()
@@ -0,0 +1,218 @@
+"""Canonical place IDs for free-text place names.
+
+"Montreal", "Montréal, Canada", "montreal " and "Montreal, QC" all normalize
+to the same key "montreal|CA". The registry stores places under that key
+string; the integer ID is a 64-bit hash of it, used for grouping records.
+
+A name without a country ("Berlin") is looked up under the country the
+geocoder reported for it. For grouping only, it also takes the country of
+the one country-qualified variant of that city we have seen ("Berlin,
+Germany"); that guess never decides which coordinates a lookup gets.
+"""
+import hashlib
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+
+from countries import countries
+
+Place = namedtuple("Place", ["id", "key", "name", "lat", "lon"])
+
+# US and Canadian postal abbreviations. The ones that are also ISO country
+# codes ("CA" California/Canada, "MA" Massachusetts/Morocco, "NL"
+# Newfoundland/Netherlands, ...) are not read as a country at all.
+postal_codes = {
+    "US": ["AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA",
+           "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ",
+           "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT",
+           "VA", "WA", "WV", "WI", "WY", "DC"],
+    "CA": ["AB", "BC", "MB", "NB", "NL", "NS", "NT", "NU", "ON", "PE", "QC", "SK", "YT"],
+}
+
+# The provinces/states we see, mapped to their country
+region_countries = {
+    "qc": "CA", "quebec": "CA", "on": "CA", "ontario": "CA", "ns": "CA", "nova scotia": "CA",
+    "bc": "CA", "british columbia": "CA", "ab": "CA", "alberta": "CA",
+    "ny": "US", "new york": "US", "ak": "US", "alaska": "US", "hi": "US", "hawaii": "US",
+    "massachusetts": "US", "california": "US",
+}
+
+# Country of each city in emissions.city_coords
+city_countries = {
+    "Santiago": "CL", "Toronto": "CA", "Paris": "FR", "New York": "US", "London": "GB",
+    "Montreal": "CA", "Lisbon": "PT", "Porto": "PT", "Halifax": "CA", "Geneva": "CH",
+    "Grenoble": "FR", "La Serena": "CL", "Amsterdam": "NL", "Hamilton": "CA", "Madrid": "ES",
+    "Munich": "DE", "Lyon": "FR", "Nice": "FR", "Marseille": "FR", "Anchorage": "US",
+    "Laval": "CA", "Saint-Alexis-des-Monts": "CA", "Trois-Rivières": "CA", "Sherbrooke": "CA",
+}
+
+
+def fold(text):
+    """Accent-free, case-folded, whitespace-collapsed text."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.replace("-", " ").replace(".", " ")
+    return " ".join(text.casefold().split())
+
+
+# Folded country names and ISO codes, then the regions, mapped to the ISO
+# country code used in canonical keys
+country_aliases = {}
+for code, names in countries.items():
+    for name in (code, *names):
+        country_aliases[fold(name)] = code
+for codes in postal_codes.values():
+    for code in codes:
+        if code in countries:
+            del country_aliases[fold(code)]
+for region, code in region_countries.items():
+    country_aliases.setdefault(region, code)
+
+
+def parse_place(query):
+    """Split "City, Region, Country" into (folded city, ISO country or None).
+
+    Unrecognized suffixes are kept so that e.g. "Springfield, Illinois" and
+    "Springfield, Oregon" stay apart.
+    """
+    parts = [fold(p) for p in str(query).split(",")]
+    parts = [p for p in parts if p]
+    if not parts:
+        return "", None
+    city, suffixes = parts[0], parts[1:]
+    country = None
+    for suffix in reversed(suffixes):
+        if suffix in country_aliases:
+            country = country_aliases[suffix]
+            break
+    else:
+        if suffixes:
+            country = suffixes[-1]
+    return city, country
+
+
+known_countries = {fold(city): country for city, country in city_countries.items()}
+
+
+def canonical_key(query):
+    city, country = parse_place(query)
+    if city in known_countries and country in (None, known_countries[city]):
+        country = known_countries[city]
+    return f"{city}|{country or ''}"
+
+
+def stable_id(key):
+    """Signed 64-bit hash of a canonical key, the same in every process."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def place_id(query):
+    """ID from the text alone; PlaceRegistry.place_id also applies what the
+    registry has learned about countries."""
+    return stable_id(canonical_key(query))
+
+
+class PlaceRegistry:
+    """Canonical places with their coordinates, shared by every caller in
+    the process. Geocoding happens at most once per canonical place,
+    including places the geocoder could not find."""
+
+    def __init__(self, coords=None):
+        self._places = {}  # canonical key -> Place
+        self._aliases = {}  # country-less key -> canonical key
+        self._by_city = defaultdict(set)  # folded city -> keys with a country
+        self._not_found = set()
+        self._lock = threading.Lock()
+        for name, (lat, lon) in (coords or {}).items():
+            self.add(name, lat, lon)
+
+    def learn(self, query):
+        """Notes the country-qualified key of ``query``, so that the bare
+        city name can map to it."""
+        city, _, country = canonical_key(query).partition("|")
+        if country:
+            with self._lock:
+                self._by_city[city].add(f"{city}|{country}")
+
+    def key(self, query):
+        """Key that coordinates are stored and looked up under: the country
+        from the text, or else the one the geocoder reported."""
+        key = canonical_key(query)
+        with self._lock:
+            return self._aliases.get(key, key)
+
+    def group_key(self, query):
+        """Like ``key``, but a name that is still country-less takes the only
+        country-qualified variant of the city we have learned. Only for
+        grouping; the variant may be a different place than the geocoder
+        would find."""
+        key = self.key(query)
+        city, _, country = key.partition("|")
+        if country:
+            return key
+        with self._lock:
+            variants = self._by_city.get(city)
+            if variants and len(variants) == 1:
+                return next(iter(variants))
+        return key
+
+    def place_id(self, query):
+        return stable_id(self.group_key(query))
+
+    def add(self, name, lat, lon, key=None):
+        key = key or canonical_key(name)
+        place = Place(stable_id(key), key, name, float(lat), float(lon))
+        city, _, country = key.partition("|")
+        with self._lock:
+            self._places[key] = place
+            self._not_found.discard(key)
+            if country:
+                self._by_city[city].add(key)
+        return place
+
+    def get(self, query):
+        return self._places.get(self.key(query))
+
+    def learned(self):
+        """Places and geocoder country aliases as plain lists, for saving
+        alongside the route memo (see ``restore``)."""
+        with self._lock:
+            return {"places": [[p.key, p.name, p.lat, p.lon] for p in self._places.values()],
+                    "aliases": sorted(self._aliases.items())}
+
+    def restore(self, learned):
+        """Adds places and aliases saved by ``learned``; places already in
+        the registry keep their coordinates."""
+        for key, name, lat, lon in learned.get("places", []):
+            if key not in self._places:
+                self.add(name, lat, lon, key=key)
+        with self._lock:
+            for key, canonical in learned.get("aliases", []):
+                self._aliases.setdefault(key, canonical)
+
+    def resolve(self, query, geocode):
+        """The canonical Place for ``query``, geocoding it on a miss.
+
+        ``geocode`` returns (lat, lon) or (lat, lon, ISO country code), or
+        None if it cannot find the place, in which case None is returned.
+        """
+        key = self.key(query)
+        place = self._places.get(key)
+        if place is not None or key in self._not_found:
+            return place
+        result = geocode(str(query).strip())
+        if result is None:
+            with self._lock:
+                self._not_found.add(key)
+            return None
+        lat, lon, *rest = result
+        city, _, country = key.partition("|")
+        if not country and rest and rest[0]:
+            canonical = f"{city}|{rest[0].upper()}"
+            with self._lock:
+                self._aliases[key] = canonical
+            if canonical in self._places:
+                return self._places[canonical]
+            key = canonical
+        return self.add(str(query).strip(), lat, lon, key=key)
@@ -0,0 +1,85 @@
+"""Server-side raster rendering of the whole route set.
+
+Records are aggregated to one arc per (origin, destination, role, mode).
+Each arc is alpha-blended, so busy corridors build up density, and its line
+width grows with the number of trips on it. The result is a single PNG, so
+the browser cost stays the same no matter how many records there are.
+"""
+import io
+
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+from pyproj import Geod
+
+geod = Geod(ellps="WGS84")
+
+linestyles = {"Plane": "-", "Train": "--", "Bus": ":", "Car": "-."}
+
+ARC_POINTS = 50
+ARC_ALPHA = 0.3
+
+
+def aggregate_routes(records):
+    """One row per (From_id, To_id, Role, Mode) with its trip count."""
+    return (records
+            .groupby(["From_id", "To_id", "Role", "Mode"], as_index=False)
+            .agg(From_lat=("From_lat", "first"), From_long=("From_long", "first"),
+                 To_lat=("To_lat", "first"), To_long=("To_long", "first"),
+                 count=("To", "size")))
+
+
+def _arc(from_lat, from_lon, to_lat, to_lon):
+    """Great-circle arc as (lon, lat) pieces, split where it crosses the dateline."""
+    inner = geod.npts(from_lon, from_lat, to_lon, to_lat, ARC_POINTS)
+    lons = np.array([from_lon] + [p[0] for p in inner] + [to_lon])
+    lats = np.array([from_lat] + [p[1] for p in inner] + [to_lat])
+    breaks = np.where(np.abs(np.diff(lons)) > 180)[0] + 1
+    return [np.column_stack(piece) for piece in zip(np.split(lons, breaks), np.split(lats, breaks))]
+
+
+def line_width(count):
+    return min(0.5 + 0.75 * np.sqrt(count), 8)
+
+
+def render_route_map_png(records, role_colors, dpi=150):
+    routes = aggregate_routes(records).dropna(subset=["From_lat", "From_long", "To_lat", "To_long"])
+    projection = ccrs.Robinson()
+    geodetic = ccrs.PlateCarree()
+
+    fig = plt.figure(figsize=(24, 12))
+    ax = plt.axes(projection=projection)
+    ax.set_global()
+    ax.add_feature(cfeature.LAND, facecolor="#F5F5F5")
+    ax.add_feature(cfeature.OCEAN, facecolor="#DCEFFF")
+    ax.add_feature(cfeature.COASTLINE, linewidth=0.4)
+    ax.add_feature(cfeature.BORDERS, linestyle=":", linewidth=0.4, color="#666666")
+
+    # One LineCollection per (role, mode) instead of one artist per route
+    for (role, mode), group in routes.groupby(["Role", "Mode"]):
+        segments, widths = [], []
+        for row in group.itertuples(index=False):
+            for piece in _arc(row.From_lat, row.From_long, row.To_lat, row.To_long):
+                segments.append(projection.transform_points(geodetic, piece[:, 0], piece[:, 1])[:, :2])
+                widths.append(line_width(row.count))
+        ax.add_collection(LineCollection(segments, linewidths=widths, alpha=ARC_ALPHA,
+                                         colors=role_colors.get(role, "gray"),
+                                         linestyles=linestyles.get(mode, "-")))
+
+    endpoints = np.vstack([routes[["From_long", "From_lat"]].to_numpy(float),
+                           routes[["To_long", "To_lat"]].to_numpy(float)])
+    ax.scatter(endpoints[:, 0], endpoints[:, 1], s=12, color="#333333", alpha=0.6,
+               transform=geodetic, zorder=3)
+
+    handles = [Line2D([], [], color=color, lw=4, label=role) for role, color in role_colors.items()]
+    handles += [Line2D([], [], color="#555555", lw=3, ls=ls, label=mode) for mode, ls in linestyles.items()]
+    ax.legend(handles=handles, loc="lower center", ncol=len(handles), fontsize=13, framealpha=0.8)
+    ax.set_title("Global Travel by Role and Mode", fontsize=18)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
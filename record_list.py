@@ -0,0 +1,45 @@
+import pandas as pd
+
+
+class RecordList:
+    """The in-session list of trips/observations before they are submitted.
+
+    Records are plain dicts kept by id in insertion order, so appending or
+    removing one is O(1). The list is shown in a single st.data_editor;
+    ``apply_edits`` folds the editor's changes back in, and ``version``
+    changes with every edit batch so the editor can be keyed on it and
+    start from the updated list.
+    """
+
+    def __init__(self, columns, defaults=None):
+        self.columns = list(columns)
+        self.defaults = defaults or {}
+        self._records = {}
+        self._next_id = 0
+        self.version = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, record):
+        self._records[self._next_id] = {col: record.get(col, self.defaults.get(col)) for col in self.columns}
+        self._next_id += 1
+
+    def apply_edits(self, changes):
+        """Applies an st.data_editor change set (row positions refer to the
+        list as it was shown)."""
+        ids = list(self._records)
+        for pos, edits in changes.get("edited_rows", {}).items():
+            self._records[ids[int(pos)]].update(edits)
+        for pos in changes.get("deleted_rows", []):
+            del self._records[ids[pos]]
+        for record in changes.get("added_rows", []):
+            self.append(record)
+        self.version += 1
+
+    def clear(self):
+        self._records.clear()
+        self.version += 1
+
+    def to_frame(self):
+        return pd.DataFrame(list(self._records.values()), columns=self.columns)
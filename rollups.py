@@ -0,0 +1,91 @@
+"""Time-bucketed emission totals for the trend views.
+
+The sheets are append-only, so each ``update`` only parses the Timestamps
+of rows it has not seen yet and adds them into day/week/month buckets per
+dimension. Trend series and rolling-window totals are then read from the
+buckets, in time proportional to the number of buckets rather than the
+number of records.
+"""
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+GRANULARITIES = ("day", "week", "month")
+# Frequency of the bucket starts, for filling in empty buckets
+FREQUENCIES = {"day": "D", "week": "W-MON", "month": "MS"}
+ALL = "All"  # dimension holding institute-wide totals
+
+
+def bucket_starts(timestamps, granularity):
+    if granularity == "day":
+        return timestamps.dt.floor("D")
+    if granularity == "week":
+        return timestamps.dt.to_period("W-SUN").dt.start_time
+    if granularity == "month":
+        return timestamps.dt.to_period("M").dt.start_time
+    raise ValueError(f"Unknown granularity {granularity!r}, expected one of {GRANULARITIES}")
+
+
+class EmissionRollups:
+    def __init__(self, value_column, dimensions):
+        self.value_column = value_column
+        self.dimensions = list(dimensions)
+        self.rows_seen = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # (granularity, dimension) -> {(dimension value, bucket start): total}
+        self._buckets = defaultdict(lambda: defaultdict(float))
+        self.rows_seen = 0
+
+    def update(self, records):
+        """Folds rows appended since the last call into the buckets.
+
+        If the record count went down (rows were removed from the sheet),
+        the rollups are rebuilt from scratch.
+        """
+        with self._lock:
+            if len(records) < self.rows_seen:
+                self._reset()
+            new = records.iloc[self.rows_seen:]
+            if new.empty:
+                return
+            timestamps = pd.to_datetime(new["Timestamp"], errors="coerce", format="ISO8601")
+            values = pd.to_numeric(new[self.value_column], errors="coerce")
+            for granularity in GRANULARITIES:
+                starts = bucket_starts(timestamps, granularity)
+                for dimension in [ALL] + self.dimensions:
+                    keys = new[dimension] if dimension != ALL else pd.Series(ALL, index=new.index)
+                    totals = values.groupby([keys, starts]).sum()
+                    bucket = self._buckets[(granularity, dimension)]
+                    for key, total in totals.items():
+                        bucket[key] += total
+            self.rows_seen = len(records)
+
+    def series(self, granularity, dimension=ALL):
+        """Totals per bucket, one column per value of ``dimension``. Buckets
+        without records between the first and last one are filled with 0,
+        so charts don't draw a line across them."""
+        with self._lock:
+            bucket = dict(self._buckets.get((granularity, dimension), {}))
+        if not bucket:
+            return pd.DataFrame()
+        totals = pd.Series(bucket)
+        totals.index.names = [dimension, "Date"]
+        frame = totals.unstack(dimension, fill_value=0).sort_index()
+        dates = pd.date_range(frame.index[0], frame.index[-1], freq=FREQUENCIES[granularity], name="Date")
+        return frame.reindex(dates, fill_value=0)
+
+    def rolling_total(self, days, dimension=ALL, now=None):
+        """Totals over the last ``days`` days per value of ``dimension``,
+        from the day buckets."""
+        start = (pd.Timestamp(now) if now is not None else pd.Timestamp.now()).floor("D") - pd.Timedelta(days=days - 1)
+        with self._lock:
+            bucket = dict(self._buckets.get(("day", dimension), {}))
+        totals = defaultdict(float)
+        for (key, day), total in bucket.items():
+            if day >= start:
+                totals[key] += total
+        return dict(totals)
@@ -0,0 +1,88 @@
+"""Bounded LRU memo of scored routes, persisted across restarts.
+
+Keyed by (origin canonical key, destination canonical key, mode, roundtrip),
+so a repeat itinerary skips geocoding and the geodesic entirely. The keys
+are the full canonical strings rather than hashed IDs, so two places can
+never share an entry.
+The file on disk carries the version of the scoring tables it was built
+with; a memo saved under another version or format is discarded on load.
+
+Given a PlaceRegistry, the file also keeps its places and the countries the
+geocoder reported, so after a restart a bare "Berlin" still maps to the
+"berlin|DE" entries without geocoding it again.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+MEMO_FORMAT = 3  # 1 was keyed by 32-bit place IDs, 2 had no places
+
+ScoredRoute = namedtuple("ScoredRoute", ["from_lat", "from_lon", "to_lat", "to_lon",
+                                         "distance_km", "co2_rate", "co2_kg"])
+
+
+class RouteMemo:
+    def __init__(self, version, maxsize=4096, path=None, places=None):
+        self.version = version
+        self.maxsize = maxsize
+        self.path = path
+        self.places = places
+        self._routes = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path is not None:
+            self.load()
+
+    @staticmethod
+    def key(from_key, to_key, mode, roundtrip):
+        return (str(from_key), str(to_key), str(mode), bool(roundtrip))
+
+    def get(self, key):
+        with self._lock:
+            route = self._routes.get(key)
+            if route is not None:
+                self._routes.move_to_end(key)
+            return route
+
+    def put(self, key, route):
+        with self._lock:
+            self._routes[key] = route
+            self._routes.move_to_end(key)
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._routes)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.version or data.get("format") != MEMO_FORMAT:
+            return
+        if self.places is not None:
+            self.places.restore(data.get("places", {}))
+        with self._lock:
+            for key, route in data["routes"][-self.maxsize:]:
+                self._routes[tuple(key)] = ScoredRoute(*route)
+
+    def save(self):
+        """Writes the memo (least recently used first) if it changed."""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": self.version, "format": MEMO_FORMAT,
+                    "routes": [[list(key), list(route)] for key, route in self._routes.items()]}
+            if self.places is not None:
+                data["places"] = self.places.learned()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
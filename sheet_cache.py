@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+
+
+# --- Google Sheets read quota ---
+# The Sheets API allows 60 read requests per minute per user; every
+# get_all_records() call counts as one. Both apps read through the same
+# service account, so each one budgets for its share of that quota.
+READS_PER_MINUTE = 60
+APPS_SHARING_QUOTA = 2
+QUOTA_WINDOW = 60.0  # seconds
+MAX_BACKOFF = 60.0  # seconds
+
+
+class QuotaBudget:
+    """Counts API calls over a sliding one-minute window and stretches the
+    cache TTL as the remaining quota shrinks."""
+
+    def __init__(self, limit=READS_PER_MINUTE // APPS_SHARING_QUOTA, window=QUOTA_WINDOW,
+                 max_ttl=QUOTA_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.max_ttl = max_ttl
+        self._calls = deque()
+        self._exhausted_until = 0.0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0] >= self.window:
+            self._calls.popleft()
+
+    def record(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._calls.append(now)
+
+    def record_failure(self):
+        """A failed read (e.g. a 429) means the shared quota is spent,
+        whatever our own count says; treat it as exhausted for a window."""
+        with self._lock:
+            self._exhausted_until = time.monotonic() + self.window
+
+    def used(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._calls)
+
+    def ttl(self, base_ttl):
+        """Cache TTL to use given the calls already spent this minute.
+
+        The TTL grows as base_ttl / remaining_fraction, so steady traffic
+        settles below the limit. Once the quota is spent (by our count or
+        by an observed failure) it lasts until the window frees up.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if now < self._exhausted_until:
+                return max(base_ttl, self._exhausted_until - now)
+            used = len(self._calls)
+            if used >= self.limit:
+                return max(base_ttl, self.window - (now - self._calls[0]))
+        remaining = 1 - used / self.limit
+        return min(self.max_ttl, base_ttl / remaining)
+
+
+class SingleFlightLoader:
+    """Caches the result of ``fetch`` and lets only one fetch run at a time.
+
+    Callers arriving while a fetch is in flight wait for it and share its
+    result instead of issuing their own request. If a fetch fails (e.g. a
+    429 from the API), callers get the last good result (or the error, if
+    there is none) without retrying until a backoff period has passed; the
+    backoff doubles with each consecutive failure.
+    """
+
+    def __init__(self, fetch, base_ttl=5, budget=None):
+        self.fetch = fetch
+        self.base_ttl = base_ttl
+        self.budget = budget or QuotaBudget()
+        self._value = None
+        self._has_value = False
+        self._fresh_until = 0.0
+        self._error = None
+        self._failures = 0
+        self._generation = 0
+        self._in_flight = False
+        self._cond = threading.Condition()
+
+    def get(self):
+        with self._cond:
+            while True:
+                if time.monotonic() < self._fresh_until:
+                    if self._has_value:
+                        return self._value
+                    raise self._error
+                if not self._in_flight:
+                    break
+                self._cond.wait()
+            self._in_flight = True
+            generation = self._generation
+
+        # Fetch outside the lock so waiting callers only block on the condition.
+        try:
+            self.budget.record()
+            value = self.fetch()
+        except Exception as e:
+            self.budget.record_failure()
+            with self._cond:
+                self._in_flight = False
+                self._failures += 1
+                backoff = min(MAX_BACKOFF, self.base_ttl * 2 ** self._failures)
+                self._fresh_until = time.monotonic() + backoff
+                self._error = e
+                self._cond.notify_all()
+                if not self._has_value:
+                    raise
+                return self._value
+
+        with self._cond:
+            self._in_flight = False
+            self._failures = 0
+            self._error = None
+            self._value = value
+            self._has_value = True
+            # A fetch that started before the last invalidate() may predate
+            # the rows we just appended: hand it back, but don't cache it as fresh.
+            if generation == self._generation:
+                self._fresh_until = time.monotonic() + self.budget.ttl(self.base_ttl)
+            self._cond.notify_all()
+            return value
+
+    def invalidate(self):
+        """Forces the next ``get`` to fetch, e.g. right after we appended rows."""
+        with self._cond:
+            self._generation += 1
+            self._fresh_until = 0.0